@@ -1,8 +1,24 @@
 import os
-import sys
 import re
+import mmap
+import argparse
+import logging
+import time
+import hashlib
+import threading
 import requests
 import json
+from html import escape
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import orjson  # optional: faster JSON encode/decode
+except ImportError:
+    orjson = None
+
+log = logging.getLogger("jira_analyzer")
 
 # --------------------------------------------------------
 # CONFIGURATION
@@ -11,13 +27,52 @@ API_KEY = "YOUR_GEMINI_API_KEY_HERE"
 MODEL = "gemini-2.0-pro"
 JIRA_DOMAIN = "https://your-jira-domain/browse/"  # e.g. "https://jira.yourcompany.com/browse/"
 
-GENERATION_URL = (
-    f"https://generativelanguage.googleapis.com/v1beta/models/"
-    f"{MODEL}:generateContent?key={API_KEY}"
-)
-
-TICKETS_PER_CHUNK = 3
+API_ROOT = "https://generativelanguage.googleapis.com/v1beta/"
+GENERATION_URL = f"{API_ROOT}models/{MODEL}:streamGenerateContent?alt=sse&key={API_KEY}"
+BATCH_URL = f"{API_ROOT}models/{MODEL}:batchGenerateContent?key={API_KEY}"
+BATCH_POLL_INTERVAL = 30  # seconds between batch job status checks
+BATCH_MAX_POLL_FAILURES = 10  # consecutive failed status checks before giving up
+BATCH_MAX_BYTES = 15 * 1024 * 1024  # encoded requests per job; inline batches cap at ~20 MB
+
+CHUNK_TOKEN_BUDGET = 24000  # estimated input tokens per request, prompt included
+MAX_OUTPUT_TOKENS = 8192  # sent as maxOutputTokens; longer replies are cut off
+OUTPUT_TOKENS_PER_TICKET = 1200  # generous per-ticket size, so a full chunk fits the cap
+MAX_TICKETS_PER_CHUNK = MAX_OUTPUT_TOKENS // OUTPUT_TOKENS_PER_TICKET
+CHARS_PER_TOKEN = 4  # rough estimate; good enough for packing
 TIMEOUT = 60
+MAX_WORKERS = 16  # chunk workers (cache lookups, parsing, API calls)
+MAX_IN_FLIGHT = 8  # Gemini requests open at once, across all workers
+
+# Caps concurrent API calls independently of the worker count, so cache
+# hits never queue behind slow generations and Gemini sees a steady load.
+API_SLOTS = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+
+# One keep-alive session shared by all workers, so only the first call per
+# pooled connection pays the TCP + TLS handshake. Everything goes to one
+# host, hence a single pool sized for the worker count.
+#
+# Throttling (429) and transient 5xx are retried inside urllib3 on the
+# same connection, with exponential backoff (up to 16 s) or whatever
+# Retry-After asks for. POST is not retried by default, so it is listed
+# explicitly. Once retries run out the last response is returned as-is
+# and call_gemini reports it like any other API error.
+SESSION = requests.Session()
+SESSION.headers.update({"Content-Type": "application/json"})
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=MAX_WORKERS,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=1.0,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "POST"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    ),
+))
+
+CACHE_DIR = ".cache"
+CACHE_TTL = 7 * 24 * 3600  # seconds; None keeps cached responses forever
 
 
 # --------------------------------------------------------
@@ -58,7 +113,7 @@ Each ticket must be represented as ONE JSON object with this exact shape:
 
 {
   "ticket_key": "",
-  "status": "",
+  "status": "",     // workflow status as written in the ticket
   "category": "",   // "Solvable Bug", "Not a Bug", or "Needs More Details"
   "summary": "",    // 1–2 sentence summary of the issue
   "root_cause": [   // bullet-style reasoning of the likely root cause
@@ -75,8 +130,7 @@ Each ticket must be represented as ONE JSON object with this exact shape:
   ],
   "missing_details": [      // only if category is 'Needs More Details' OR if something is unclear
     "..."
-  ],
-  "link": ""        // Jira link; if missing, construct with the ticket key
+  ]
 }
 
 Rules and expectations:
@@ -92,6 +146,8 @@ Rules and expectations:
 - "missing_details" should list EXACT things needed: logs, screenshots, reproduction steps, build number, OS version, watch/phone pairing state, etc.
 - If you believe something is "Not a Bug", clearly explain in "reasoning" why the behavior is expected or spec-compliant.
 - If you select "Needs More Details", still try to infer as much as possible from the ticket, but list clearly what is blocking you.
+- Do NOT output a link; it is built from the ticket key separately.
+- Return the tickets in the same order they appear in the input.
 - Always return an ARRAY: [ { ... }, { ... } ] even if there is only 1 ticket in the chunk.
 - Do NOT use markdown. Do NOT add any prose outside the JSON.
 
@@ -100,11 +156,16 @@ Now analyze these tickets:
 
 
 # --------------------------------------------------------
-# READ INPUT TEXT FILE
+# MAP INPUT TEXT FILE
+# The dump is memory-mapped and scanned as bytes; only the
+# ticket slices are ever decoded, so a large export never has
+# to sit in memory as one decoded str.
 # --------------------------------------------------------
-def read_text(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
+def map_input(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""  # mmap refuses empty files
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 
 
 # --------------------------------------------------------
@@ -113,67 +174,368 @@ def read_text(path):
 #   any line containing "Jira"
 # followed by
 #   next line starting with [G7APP-xxxxx]
+# The same scan also picks up each ticket's "Status:" line
+# (indentation allowed), which overrides the model's reading of
+# it; the model's status is only kept when no such line exists.
 # --------------------------------------------------------
-def extract_tickets(text):
-    pattern = r"(?m)^.*Jira.*\n\[G7APP-\d+\]"
-    matches = list(re.finditer(pattern, text))
+TICKET_RE = re.compile(
+    rb"(?m)^[^\n]*Jira[^\n]*\n\[(?P<key>G7APP-\d+)\]"
+    rb"|^[ \t]*Status:[ \t]*(?P<status>[^\r\n]*)"
+)
 
-    tickets = []
-    for i in range(len(matches)):
-        start = matches[i].start()
-        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
-        tickets.append(text[start:end].strip())
 
+# `data` is the mapped dump (any bytes-like object).
+def extract_tickets(data):
+    # Every ticket header contains both literals, so check for them in C
+    # and only start the regex from the line before the first header.
+    first = data.find(b"\n[G7APP-")
+    if first == -1 or data.find(b"Jira") == -1:
+        return []
+    scan_from = data.rfind(b"\n", 0, first) + 1
+
+    # Single pass: each header closes the previous ticket, so only
+    # offsets are kept and the text is decoded when a chunk is built.
+    tickets = []
+    current = None
+    for m in TICKET_RE.finditer(data, scan_from):
+        key = m.group("key")
+        if key:
+            if current:
+                current["end"] = m.start()
+            current = {"key": key.decode("ascii"), "status": "", "start": m.start()}
+            tickets.append(current)
+        elif current and not current["status"]:
+            current["status"] = m.group("status").decode("utf-8", "replace").strip()
+
+    if current:
+        current["end"] = len(data)
     return tickets
 
 
+def ticket_text(data, ticket):
+    return data[ticket["start"]:ticket["end"]].decode("utf-8", "replace").strip()
+
+
 # --------------------------------------------------------
-# CHUNK TICKETS (3 per chunk)
+# DROP DUPLICATE TICKET BLOCKS
+# Re-exported dumps often repeat a ticket verbatim. Only the
+# first copy is sent to Gemini; copies are recognised by a
+# BLAKE2b digest of their bytes, not by comparing the text.
+# A verbatim copy carries the same key, so it would only have
+# produced the same card twice.
 # --------------------------------------------------------
-def chunk_tickets(tickets):
-    chunks = []
-    for i in range(0, len(tickets), TICKETS_PER_CHUNK):
-        joined = "\n\n---\n\n".join(tickets[i: i + TICKETS_PER_CHUNK])
-        chunks.append(joined)
-    return chunks
+def dedupe_tickets(data, tickets):
+    seen = set()
+    unique = []
+    for ticket in tickets:
+        block = data[ticket["start"]:ticket["end"]].strip()
+        digest = hashlib.blake2b(block, digest_size=16).digest()
+        if digest not in seen:
+            seen.add(digest)
+            unique.append(ticket)
+    return unique
+
+
+# --------------------------------------------------------
+# CHUNK TICKETS
+# Greedily packs tickets until the estimated token count would
+# exceed CHUNK_TOKEN_BUDGET or the chunk holds as many tickets
+# as one reply has room for (MAX_TICKETS_PER_CHUNK, derived
+# from the output token limit). Short tickets share a request;
+# long ones get one to themselves. A ticket's size comes from
+# its offsets, so nothing is decoded just to measure it.
+# --------------------------------------------------------
+def estimate_tokens(n_chars):
+    return n_chars // CHARS_PER_TOKEN + 1
+
+
+def join_chunk(data, group):
+    return "\n\n---\n\n".join(ticket_text(data, t) for t in group)
+
+
+# Returns the groups of tickets; join_chunk() turns one into prompt text.
+def chunk_tickets(data, tickets):
+    budget = CHUNK_TOKEN_BUDGET - estimate_tokens(len(PROMPT_TEMPLATE))
+
+    groups = []
+    group, used = [], 0
+    for ticket in tickets:
+        cost = estimate_tokens(ticket["end"] - ticket["start"])
+        if group and (used + cost > budget or len(group) >= MAX_TICKETS_PER_CHUNK):
+            groups.append(group)
+            group, used = [], 0
+        group.append(ticket)
+        used += cost
+
+    if group:
+        groups.append(group)
+    return groups
+
+
+# --------------------------------------------------------
+# JSON ENCODE / DECODE
+# orjson when it is installed, stdlib json otherwise.
+# --------------------------------------------------------
+def encode_json(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def decode_json(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 
 # --------------------------------------------------------
 # CALL GEMINI
 # --------------------------------------------------------
+def build_payload(chunk_text):
+    # Prompt and tickets travel as separate parts: no per-call copy of
+    # the prompt, and the request starts with the exact same prefix
+    # every time, which is what Gemini's implicit caching keys on.
+    return {
+        "contents": [
+            {"parts": [{"text": PROMPT_TEMPLATE}, {"text": chunk_text}]}
+        ],
+        "generationConfig": {"maxOutputTokens": MAX_OUTPUT_TOKENS},
+    }
+
+
+def response_text(body):
+    return body["candidates"][0]["content"]["parts"][0]["text"]
+
+
+# The reply is streamed as server-sent events, one "data: {...}" line per
+# partial response. TIMEOUT then bounds the gap between events rather than
+# the whole generation, so long answers no longer hit a read timeout.
 def call_gemini(chunk_text):
     if not chunk_text:
         return None
 
-    payload = {
-        "contents": [
-            {"parts": [{"text": PROMPT_TEMPLATE + "\n" + chunk_text}]}
-        ]
-    }
+    payload = build_payload(chunk_text)
 
     try:
-        response = requests.post(
+        with API_SLOTS, SESSION.post(
             GENERATION_URL,
-            headers={"Content-Type": "application/json"},
-            data=json.dumps(payload),
+            data=encode_json(payload),
+            timeout=TIMEOUT,
+            stream=True,
+        ) as response:
+            if response.status_code != 200:
+                log.error("❌ API Error: %s", response.text[:500])
+                return None
+
+            pieces = []
+            for line in response.iter_lines():
+                # Closing events carry only finishReason / usageMetadata;
+                # a byte search is enough to skip decoding them.
+                if not line.startswith(b"data: ") or b'"text"' not in line:
+                    continue
+                # Only decoding and indexing count as a shape error; requests'
+                # own ValueError subclasses (InvalidURL, ...) are network errors.
+                try:
+                    event = decode_json(line[6:])
+                    for part in event.get("candidates", [{}])[0].get("content", {}).get("parts", []):
+                        pieces.append(part.get("text", ""))
+                except (ValueError, LookupError, AttributeError, TypeError):
+                    log.error("❌ Unexpected response shape from Gemini.")
+                    return None
+    except Exception as e:
+        log.error("❌ Network error: %s", e)
+        return None
+
+    if not pieces:
+        log.error("❌ Unexpected response shape from Gemini.")
+        return None
+
+    return "".join(pieces)
+
+
+# --------------------------------------------------------
+# CALL GEMINI (BATCH MODE)
+# Submits chunks as asynchronous batch jobs and polls them
+# until they finish. Slower to come back than the threaded
+# path, but a handful of requests for the whole dump at batch
+# pricing. Inline batches are size-capped, so the chunks are
+# split into jobs of at most BATCH_MAX_BYTES of encoded JSON.
+# --------------------------------------------------------
+def batch_entry(idx, chunk):
+    return {"request": build_payload(chunk), "metadata": {"key": str(idx)}}
+
+
+def submit_batch(chunks_by_idx):
+    requests_list = [batch_entry(idx, chunk) for idx, chunk in chunks_by_idx.items()]
+    body = {
+        "batch": {
+            "display_name": "jira-analyzer",
+            "input_config": {"requests": {"requests": requests_list}},
+        }
+    }
+
+    try:
+        response = SESSION.post(
+            BATCH_URL,
+            data=encode_json(body),
             timeout=TIMEOUT,
         )
     except Exception as e:
-        print("❌ Network error:", e)
+        log.error("❌ Network error: %s", e)
         return None
 
     if response.status_code != 200:
-        print("❌ API Error:", response.text[:500])
+        log.error("❌ Batch API Error: %s", response.text[:500])
         return None
 
+    return decode_json(response.content).get("name")
+
+
+def wait_for_batch(name):
+    url = f"{API_ROOT}{name}?key={API_KEY}"
+    failures = 0
+    while True:
+        try:
+            response = SESSION.get(url, timeout=TIMEOUT)
+        except Exception as e:
+            failures += 1
+            if failures >= BATCH_MAX_POLL_FAILURES:
+                log.error("❌ Batch %s: status check failed %d times, giving up: %s", name, failures, e)
+                return None
+            log.warning("⚠️ Batch status check failed, retrying: %s", e)
+            time.sleep(BATCH_POLL_INTERVAL)
+            continue
+        failures = 0
+
+        if response.status_code != 200:
+            log.error("❌ Batch status error: %s", response.text[:500])
+            return None
+
+        operation = decode_json(response.content)
+        if operation.get("done"):
+            if "error" in operation:
+                log.error("❌ Batch job failed: %s", operation["error"])
+                return None
+            return operation.get("response", {})
+
+        state = operation.get("metadata", {}).get("state", "running")
+        log.info("⏳ Batch %s: %s", name, state)
+        time.sleep(BATCH_POLL_INTERVAL)
+
+
+# Groups {chunk index: chunk text} into job-sized dicts, in order.
+# Sizes are measured on the encoded request, since JSON escaping and
+# UTF-8 can make it noticeably larger than the chunk's character count.
+def split_batches(chunks_by_idx):
+    batch, size = {}, 0
+    for idx, chunk in chunks_by_idx.items():
+        entry_size = len(encode_json(batch_entry(idx, chunk))) + 1
+        if batch and size + entry_size > BATCH_MAX_BYTES:
+            yield batch
+            batch, size = {}, 0
+        batch[idx] = chunk
+        size += entry_size
+    if batch:
+        yield batch
+
+
+# Returns {chunk index: raw model text} for the entries that succeeded.
+def batch_texts(output, chunks_by_idx):
+    if output is None:
+        return {}
+
+    inlined = output.get("inlinedResponses", [])
+    if isinstance(inlined, dict):
+        inlined = inlined.get("inlinedResponses", [])
+
+    texts = {}
+    order = list(chunks_by_idx)
+    for pos, item in enumerate(inlined):
+        key = item.get("metadata", {}).get("key")
+        idx = int(key) if key is not None else order[pos]
+        if "error" in item:
+            log.error("❌ Batch entry for chunk %d failed: %s", idx + 1, item["error"])
+            continue
+        try:
+            texts[idx] = response_text(item["response"])
+        except Exception:
+            log.error("❌ Unexpected response shape for chunk %d.", idx + 1)
+    return texts
+
+
+# Submits every job up front, then polls them side by side, so the
+# wait is that of the slowest job rather than the sum of all of them.
+# Yields (chunks_by_idx, {chunk index: raw model text}) per job as it
+# finishes; a job that could not be submitted yields an empty dict.
+def call_gemini_batches(batches):
+    jobs = {}
+    for batch in batches:
+        name = submit_batch(batch)
+        if not name:
+            yield batch, {}
+            continue
+        log.info("📨 Batch job submitted: %s", name)
+        jobs[name] = batch
+
+    if not jobs:
+        return
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as ex:
+        futures = {ex.submit(wait_for_batch, name): name for name in jobs}
+        for future in as_completed(futures):
+            batch = jobs[futures[future]]
+            yield batch, batch_texts(future.result(), batch)
+
+
+# --------------------------------------------------------
+# RESPONSE CACHE
+# Key = SHA-256 of model + prompt + chunk, so any change to
+# one of them is a miss. Entries live in CACHE_DIR/<key>.json
+# and expire CACHE_TTL seconds after they were written.
+# --------------------------------------------------------
+def cache_key(chunk_text):
+    material = MODEL + "\n" + PROMPT_TEMPLATE + "\n" + chunk_text
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def read_cache(key):
+    path = os.path.join(CACHE_DIR, key + ".json")
     try:
-        text = response.json()["candidates"][0]["content"]["parts"][0]["text"]
-        return text
-    except Exception:
-        print("❌ Unexpected response shape from Gemini.")
+        if CACHE_TTL is not None and time.time() - os.path.getmtime(path) > CACHE_TTL:
+            return None
+        with open(path, "rb") as f:
+            return decode_json(f.read())["text"]
+    except (OSError, ValueError, KeyError):
         return None
 
 
+def write_cache(key, text):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, key + ".json")
+    # Write to a private temp file and rename it into place, so an
+    # interrupted run or a parallel writer never leaves a torn entry.
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(encode_json({"model": MODEL, "text": text}))
+    os.replace(tmp_path, path)
+
+
+# Callers only store answers that extract_json could parse; a
+# truncated or malformed response should be retried on the next run.
+def store_response(key, text):
+    try:
+        write_cache(key, text)
+    except OSError as e:
+        log.warning("⚠️ Could not write cache entry: %s", e)
+
+
+# Parsed results of a cached answer, or None on a miss. An entry that
+# no longer parses counts as a miss, so it gets fetched again.
+def read_cached_results(key):
+    cached = read_cache(key)
+    return extract_json(cached) if cached is not None else None
+
+
 # --------------------------------------------------------
 # EXTRACT JSON BETWEEN <JSON> ... </JSON>
 # --------------------------------------------------------
@@ -181,26 +543,61 @@ def extract_json(raw_text):
     if raw_text is None:
         return None
 
-    raw = raw_text.strip()
-    start = raw.find("<JSON>")
-    end = raw.find("</JSON>")
+    # One forward walk: the closing tag is only looked for after the
+    # opening one, so a stray "</JSON>" earlier in the reply is ignored.
+    _, opened, rest = raw_text.partition("<JSON>")
+    json_block, closed, _ = rest.partition("</JSON>")
 
-    if start == -1 or end == -1:
-        print("❌ Missing <JSON> tags in Gemini response.")
+    if not opened or not closed:
+        log.error("❌ Missing <JSON> tags in Gemini response.")
         return None
 
-    json_block = raw[start + len("<JSON>"): end].strip()
+    json_block = json_block.strip()
 
     try:
-        data = json.loads(json_block)
-        if isinstance(data, dict):
-            data = [data]
-        return data
+        data = decode_json(json_block)
     except Exception as e:
-        print("❌ JSON decode error:", e)
-        print("⚠️ Raw JSON block that failed:\n", json_block[:500])
+        log.error("❌ JSON decode error: %s", e)
+        log.warning("⚠️ Raw JSON block that failed:\n%s", json_block[:500])
+        return None
+
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        log.error("❌ Expected a JSON array, got %s.", type(data).__name__)
         return None
 
+    # Anything that is not an object can't be rendered as a card.
+    results = [obj for obj in data if isinstance(obj, dict)]
+    if not results:
+        log.error("❌ No ticket objects in Gemini response.")
+        return None
+    return results
+
+
+# --------------------------------------------------------
+# FILL FIELDS ALREADY KNOWN FROM THE TICKET TEXT
+# --------------------------------------------------------
+# `keys` are the ticket keys of the chunk, in input order. A key the
+# model got wrong is replaced by the one at the same position, as
+# long as it answered once per ticket.
+def apply_ticket_meta(results, keys, meta_by_key):
+    positional = len(results) == len(keys)
+    for pos, obj in enumerate(results):
+        key = obj.get("ticket_key")
+        if key not in keys and positional:
+            key = keys[pos]
+        if not isinstance(key, str):
+            key = None
+        obj["ticket_key"] = key
+
+        meta = meta_by_key.get(key)
+        if meta and meta["status"]:
+            obj["status"] = meta["status"]
+        # Always overwritten, so a link the model made up never reaches href.
+        obj["link"] = JIRA_DOMAIN + key if key else None
+    return results
+
 
 # --------------------------------------------------------
 # HELPER: ARRAY -> <li> LIST HTML
@@ -215,14 +612,15 @@ def list_to_html(items):
         safe_items.append(str(it))
     if not safe_items:
         return "<li>-</li>"
-    return "".join(f"<li>{entry}</li>" for entry in safe_items)
+    return "".join(f"<li>{escape(entry)}</li>" for entry in safe_items)
 
 
 # --------------------------------------------------------
-# GENERATE MODERN CARD-STYLE HTML FROM JSONL
+# HTML TEMPLATES
+# Built once at import; CARD_TEMPLATE is filled per ticket
+# with str.format, so the markup is not re-parsed per card.
 # --------------------------------------------------------
-def generate_html(jsonl_path, output_path):
-    html = """
+HTML_HEADER = """
 <html>
 <head>
 <title>Jira Bug Analysis Report</title>
@@ -322,33 +720,7 @@ def generate_html(jsonl_path, output_path):
 <div class="grid">
 """
 
-    with open(jsonl_path, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            data = json.loads(line)
-            results = data.get("results", [])
-            for obj in results:
-                ticket_key = obj.get("ticket_key", "")
-                status = obj.get("status", "")
-                category = obj.get("category", "")
-                summary = obj.get("summary", "")
-
-                root_cause = obj.get("root_cause", [])
-                reasoning = obj.get("reasoning", [])
-                fix = obj.get("fix_recommendation", [])
-                risk = obj.get("risk", [])
-                missing = obj.get("missing_details", [])
-                link = obj.get("link") or (JIRA_DOMAIN + ticket_key if ticket_key else "#")
-
-                if category == "Solvable Bug":
-                    badge_class = "green"
-                elif category == "Needs More Details":
-                    badge_class = "amber"
-                else:
-                    badge_class = "gray"
-
-                html += f"""
+CARD_TEMPLATE = """
 <div class="card">
   <div class="ticket-header">
     <a href="{link}" class="ticket-key" target="_blank" rel="noopener noreferrer">{ticket_key}</a>
@@ -359,89 +731,230 @@ def generate_html(jsonl_path, output_path):
 
   <div class="section-title">Root Cause</div>
   <ul>
-    {list_to_html(root_cause)}
+    {root_cause}
   </ul>
 
   <div class="section-title">Reasoning</div>
   <ul>
-    {list_to_html(reasoning)}
+    {reasoning}
   </ul>
 
   <div class="section-title">Fix Recommendation</div>
   <ul>
-    {list_to_html(fix)}
+    {fix}
   </ul>
 
   <div class="section-title">Risk</div>
   <ul>
-    {list_to_html(risk)}
+    {risk}
   </ul>
 
   <div class="section-title">Missing Details</div>
   <ul>
-    {list_to_html(missing)}
+    {missing}
   </ul>
 </div>
 """
 
-    html += """
+HTML_FOOTER = """
 </div> <!-- grid -->
 </body>
 </html>
 """
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(html)
+HTML_WRITE_BUFFER = 64 * 1024  # bytes buffered before each write to the report
 
-    print(f"📁 HTML report saved → {output_path}")
+# Category -> badge colour; anything else (e.g. "Not a Bug") is gray.
+BADGE_CLASSES = {
+    "Solvable Bug": "green",
+    "Needs More Details": "amber",
+}
 
 
 # --------------------------------------------------------
-# MAIN
+# GENERATE MODERN CARD-STYLE HTML
+# `results` is any iterable of ticket result dicts, rendered in
+# the order it yields them.
 # --------------------------------------------------------
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python jira_g7app_analyzer.py jira_dump.txt")
+def generate_html(results, output_path):
+    # Cards are streamed straight to the file instead of growing one
+    # big string, which would be re-copied on every append. Each card
+    # is ~1-2 KB, so a 64 KB buffer batches dozens of them per write().
+    with open(output_path, "w", encoding="utf-8", buffering=HTML_WRITE_BUFFER) as out:
+        out.write(HTML_HEADER)
+
+        # Model output can contain <, > and & (stack traces, code), so
+        # every text field is escaped before it goes into the markup.
+        esc = escape
+        for obj in results:
+            ticket_key = str(obj.get("ticket_key") or "")
+            category = str(obj.get("category") or "")
+            link = obj.get("link") or (JIRA_DOMAIN + ticket_key if ticket_key else "#")
+
+            out.write(CARD_TEMPLATE.format(
+                link=esc(str(link), quote=True),
+                ticket_key=esc(ticket_key),
+                badge_class=BADGE_CLASSES.get(category, "gray"),
+                category=esc(category),
+                status=esc(str(obj.get("status") or "")),
+                summary=esc(str(obj.get("summary") or "")),
+                root_cause=list_to_html(obj.get("root_cause", [])),
+                reasoning=list_to_html(obj.get("reasoning", [])),
+                fix=list_to_html(obj.get("fix_recommendation", [])),
+                risk=list_to_html(obj.get("risk", [])),
+                missing=list_to_html(obj.get("missing_details", [])),
+            ))
+
+        out.write(HTML_FOOTER)
+
+    log.info("📁 HTML report saved → %s", output_path)
+
+
+# --------------------------------------------------------
+# PROCESS CHUNKS
+# Both runners take the mapped dump plus the ticket groups and
+# yield (chunk index, parsed results or None) pairs in whatever
+# order they finish. Chunk text is only decoded when a chunk is
+# processed, so the dump is never held decoded all at once.
+# --------------------------------------------------------
+# With use_cache=False cached answers are ignored, but the fresh
+# answer still replaces the stored one.
+def analyze_chunk(data, group, use_cache=True):
+    chunk_text = join_chunk(data, group)
+    key = cache_key(chunk_text)
+    parsed = read_cached_results(key) if use_cache else None
+    if parsed is not None:
+        return parsed
+
+    text = call_gemini(chunk_text)
+    parsed = extract_json(text)
+    if parsed is not None:
+        store_response(key, text)
+    return parsed
+
+
+def run_threaded(data, groups, use_cache=True):
+    # Chunks are independent, so fan them out to a bounded pool. Parsing
+    # happens in the worker too, leaving only file writes to the caller.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {
+            ex.submit(analyze_chunk, data, group, use_cache): idx
+            for idx, group in enumerate(groups)
+        }
+        log.info("🚀 Processing %d chunks with %d workers", len(groups), MAX_WORKERS)
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            idx = futures[future]
+            log.info("✔️ Chunk %d finished (%d/%d)", idx + 1, done, len(groups))
+            yield idx, future.result()
+
+
+# Only the cache misses are kept in memory; they go out in
+# job-sized pieces and each job's results are yielded as soon as
+# it finishes.
+def run_batch(data, groups, use_cache=True):
+    misses = {}
+    for idx, group in enumerate(groups):
+        chunk = join_chunk(data, group)
+        parsed = read_cached_results(cache_key(chunk)) if use_cache else None
+        if parsed is not None:
+            yield idx, parsed
+        else:
+            misses[idx] = chunk
+
+    if not misses:
         return
 
-    input_path = sys.argv[1]
-    raw_text = read_text(input_path)
+    batches = list(split_batches(misses))
+    log.info("🚀 Sending %d uncached chunks as %d batch job(s)", len(misses), len(batches))
+    for batch, texts in call_gemini_batches(batches):
+        for idx, chunk in batch.items():
+            text = texts.get(idx)
+            parsed = extract_json(text)
+            if parsed is not None:
+                store_response(cache_key(chunk), text)
+            yield idx, parsed
 
-    print("🔍 Extracting tickets...")
-    tickets = extract_tickets(raw_text)
-    print("📦 Tickets found:", len(tickets))
+
+# --------------------------------------------------------
+# MAIN
+# --------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Triage a Jira text dump with Gemini.")
+    parser.add_argument("input_path", help="Jira dump text file")
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="send uncached chunks as Gemini batch jobs (split by size) instead of concurrent calls",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"ignore cached responses in {CACHE_DIR}/ (fresh ones still overwrite them)",
+    )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="only log warnings and errors, not per-chunk progress",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.WARNING if args.quiet else logging.INFO,
+        format="%(asctime)s %(message)s",
+    )
+
+    data = map_input(args.input_path)
+
+    log.info("🔍 Extracting tickets...")
+    tickets = extract_tickets(data)
+    log.info("📦 Tickets found: %d", len(tickets))
 
     if not tickets:
-        print("⚠️ No tickets detected. Check the format / regex.")
+        log.warning("⚠️ No tickets detected. Check the format / regex.")
         return
 
-    chunks = chunk_tickets(tickets)
-    print("✂️ Chunks to process:", len(chunks))
+    unique = dedupe_tickets(data, tickets)
+    if len(unique) < len(tickets):
+        log.info("♻️ Skipping %d duplicate ticket blocks", len(tickets) - len(unique))
+    tickets = unique
+
+    groups = chunk_tickets(data, tickets)
+    meta_by_key = {t["key"]: t for t in tickets}
+    log.info("✂️ Chunks to process: %d", len(groups))
 
     jsonl_path = "jira_results.jsonl"
-    jsonl_file = open(jsonl_path, "w", encoding="utf-8")
+    jsonl_file = open(jsonl_path, "wb")
 
-    for idx, chunk in enumerate(chunks):
-        print(f"\n🚀 Processing chunk {idx + 1}/{len(chunks)}")
-        raw_output = call_gemini(chunk)
-        parsed = extract_json(raw_output)
+    runner = run_batch if args.batch else run_threaded
+    outputs = runner(data, groups, use_cache=not args.no_cache)
 
+    # Results are archived to JSONL as they land and kept in memory for
+    # the report, so the JSONL never has to be read back and re-parsed.
+    # "chunk" keeps the original position for putting them back in order.
+    results_by_chunk = {}
+    for idx, parsed in outputs:
         if parsed is None:
-            print("⚠️ Skipping this chunk due to JSON issues.")
+            log.warning("⚠️ Skipping chunk %d due to JSON issues.", idx + 1)
             continue
 
-        jsonl_file.write(json.dumps({
+        results = apply_ticket_meta(parsed, [t["key"] for t in groups[idx]], meta_by_key)
+        results_by_chunk[idx] = results
+        jsonl_file.write(encode_json({
             "chunk": idx,
-            "results": parsed
-        }) + "\n")
+            "results": results
+        }) + b"\n")
 
     jsonl_file.close()
-    print("📁 JSONL saved →", jsonl_path)
+    log.info("📁 JSONL saved → %s", jsonl_path)
 
-    print("\n🎨 Generating HTML dashboard...")
-    generate_html(jsonl_path, "jira_report.html")
+    log.info("🎨 Generating HTML dashboard...")
+    generate_html(
+        (obj for idx in sorted(results_by_chunk) for obj in results_by_chunk[idx]),
+        "jira_report.html",
+    )
 
-    print("\n✅ DONE. Open 'jira_report.html' in your browser.")
+    log.info("✅ DONE. Open 'jira_report.html' in your browser.")
 
 
 if __name__ == "__main__":